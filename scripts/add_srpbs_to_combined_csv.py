@@ -3,6 +3,7 @@
 Add SRPBS subjects to combined synthseg processing CSV
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
@@ -19,38 +20,37 @@ output_csv = Path("/mnt/db_ext/RAW/oasis/oasis_srpbs_combined_synthseg_processin
 oasis_df = pd.read_csv(oasis_csv)
 print(f"\nOASIS CSV loaded: {len(oasis_df)} subjects")
 
-# Find all SRPBS subjects
-subjects = sorted([d for d in srpbs_bids.iterdir() if d.is_dir() and d.name.startswith('sub-')])
-print(f"SRPBS subjects found: {len(subjects)}")
-
-# Create SRPBS entries
-srpbs_entries = []
-
-for subject_dir in subjects:
-    subject_id = subject_dir.name
-    anat_dir = subject_dir / 'anat'
-
-    # Find T1w file
-    t1w_file = anat_dir / f"{subject_id}_T1w.nii.gz"
-
-    if t1w_file.exists():
-        srpbs_entries.append({
-            'subject_id': subject_id,
-            'input_image': str(t1w_file.absolute()),
-            'output_dir': str(srpbs_bids / 'derivatives' / 'synthseg'),
-            'num_threads': 4
-        })
-
-print(f"SRPBS entries created: {len(srpbs_entries)}")
-
-# Create SRPBS DataFrame
-srpbs_df = pd.DataFrame(srpbs_entries)
-
-# Combine with OASIS
-combined_df = pd.concat([oasis_df, srpbs_df], ignore_index=True)
-
-# Save combined CSV
-combined_df.to_csv(output_csv, index=False)
+# Find all SRPBS T1w images in a single recursive walk instead of
+# stat'ing anat/ and the T1w file for every subject
+t1w_files = sorted(srpbs_bids.glob('sub-*/anat/sub-*_T1w.nii.gz'))
+print(f"SRPBS T1w images found: {len(t1w_files)}")
+
+# Create SRPBS entries as column lists (SoA) rather than a list of
+# per-row dicts, so the DataFrame is built from ready-made columns
+subject_ids = []
+input_images = []
+synthseg_dir = str(srpbs_bids / 'derivatives' / 'synthseg')
+
+for t1w_file in t1w_files:
+    subject_ids.append(t1w_file.parents[1].name)  # sub-XXXX/anat/sub-XXXX_T1w.nii.gz
+    input_images.append(str(t1w_file.absolute()))
+
+print(f"SRPBS entries created: {len(subject_ids)}")
+
+# Create SRPBS DataFrame column-wise: no per-row dict hashing and no
+# AoS -> SoA transpose or dtype re-inference inside pandas
+srpbs_df = pd.DataFrame({
+    'subject_id': subject_ids,
+    'input_image': input_images,
+    'output_dir': synthseg_dir,
+    'num_threads': np.full(len(subject_ids), 4, dtype=np.int8)
+})
+
+# Combine with OASIS (copy=False skips one extra copy of the column blocks)
+combined_df = pd.concat([oasis_df, srpbs_df], ignore_index=True, copy=False)
+
+# Save combined CSV (fixed lineterminator skips platform-EOL translation)
+combined_df.to_csv(output_csv, index=False, lineterminator='\n')
 
 print(f"\n✓ Combined CSV saved: {output_csv}")
 print(f"\nTotal subjects in combined CSV: {len(combined_df)}")
@@ -11,350 +11,460 @@ from pathlib import Path
 import nibabel as nib
 import numpy as np
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Paths
 oasis2_raw = "/mnt/db_ext/RAW/oasis/OASIS 2"
 oasis2_bids = "/mnt/db_ext/RAW/oasis/OASIS2_BIDS"
 
-print("="*80)
-print("OASIS-2: Converting Analyze 7.5 to BIDS (Longitudinal)")
-print("="*80)
-
-# Get list of sessions
-if not Path(oasis2_raw).exists():
-    print(f"\n✗ ERRORE: La directory di input non esiste: {oasis2_raw}")
-    print("Verifica che il percorso sia corretto e che il disco sia montato.")
-    exit(1)
-
-sessions = sorted([d for d in os.listdir(oasis2_raw) if d.startswith('OAS2_')])
-print(f"\nFound {len(sessions)} imaging sessions")
-
-if not sessions:
-    print("\n⚠ ATTENZIONE: Nessuna sessione di imaging trovata nella directory di input.")
-    print(f"Controlla che la directory '{oasis2_raw}' contenga le cartelle delle sessioni (es. 'OAS2_0001_MR1').")
-
-# Storage for participants and sessions data
-participants_data = {}
-sessions_data = []
-conversion_errors = []
-
-# Process each session
-for i, session in enumerate(sessions, 1):
-    # Parse subject and session ID
-    # Format: OAS2_0001_MR1, OAS2_0001_MR2, etc.
-    match = re.match(r'(OAS2_\d+)_MR(\d+)', session)
-    if not match:
-        conversion_errors.append(f"Cannot parse session ID: {session}")
-        continue
+# gzip level 1 instead of nibabel's default: MPRAGE volumes compress only
+# marginally better at higher levels but take several times longer to write
+nib.openers.Opener.default_compresslevel = 1
 
-    subject_id = match.group(1)  # OAS2_0001
-    session_num = int(match.group(2))  # 1, 2, 3, etc.
+# Session directory name: OAS2_0001_MR1, OAS2_0001_MR2, etc.
+SESSION_RE = re.compile(r'(OAS2_\d+)_MR(\d+)')
+
+# Metadata keys whose values are numeric; classified up front so parsing
+# needs no exception handling in the hot path
+NUMERIC_KEYS = frozenset({'AGE', 'EDUC', 'SES', 'CDR', 'MMSE', 'eTIV', 'ASF', 'nWBV'})
+TEXT_KEYS = frozenset({'M/F', 'HAND', 'DELAY'})
+
+
+# JSON writes happen as a single buffered write_bytes call, with orjson's
+# C serializer when it is installed
+try:
+    import orjson
+
+    def write_json(path, obj):
+        Path(path).write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+except ImportError:
+    def write_json(path, obj):
+        Path(path).write_text(json.dumps(obj, indent=2))
+
+
+# Directories already created this run: repeated sessions under the same
+# subject skip part of the makedirs stat chatter
+_created_dirs = set()
 
-    bids_subject_id = f"sub-{subject_id}"
-    bids_session_id = f"ses-{session_num:02d}"
 
-    if i % 50 == 0 or i == 1:
-        print(f"\n[{i}/{len(sessions)}] Processing {subject_id} {bids_session_id}...")
+def _ensure_dir(path):
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
 
-    # Create BIDS directory structure
-    session_dir = Path(oasis2_bids) / bids_subject_id / bids_session_id / "anat"
-    session_dir.mkdir(parents=True, exist_ok=True)
 
-    # Path to original session data
+def find_hdr_files(root):
+    """Recursively yield '*nifti.hdr' paths under root via os.scandir.
+
+    Much faster than Path.glob('**/*nifti.hdr'): DirEntry.is_dir() reads
+    the cached d_type instead of issuing a stat() per entry.
+    """
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('nifti.hdr'):
+                    yield entry.path
+
+
+def parse_session(session):
+    """Parse one session directory: IDs, TXT metadata and .hdr files.
+
+    Pure filesystem I/O, so sessions can be parsed concurrently from a
+    thread pool. Returns None if the session name cannot be parsed.
+    """
+    match = SESSION_RE.match(session)
+    if not match:
+        return None
+
+    subject_id = match.group(1)  # OAS2_0001
+    session_num = int(match.group(2))  # 1, 2, 3, etc.
+
     orig_session_dir = Path(oasis2_raw) / session
-    raw_dir = orig_session_dir / "RAW"
 
     # Parse metadata from TXT file
     txt_file = orig_session_dir / f"{session}.txt"
     metadata = {}
 
     if txt_file.exists():
-        with open(txt_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip()
-                    value = value.strip()
-
-                    if key in ['AGE', 'EDUC', 'SES', 'CDR', 'MMSE', 'eTIV', 'ASF', 'nWBV']:
-                        try:
-                            metadata[key] = float(value) if '.' in value else int(value)
-                        except:
-                            metadata[key] = value
-                    elif key in ['M/F', 'HAND', 'DELAY']:
-                        metadata[key] = value
-
-    # Add session data
-    sessions_data.append({
-        'participant_id': bids_subject_id,
-        'session_id': bids_session_id,
-        'age': metadata.get('AGE', 'n/a'),
-        'cdr': metadata.get('CDR', 'n/a'),
-        'mmse': metadata.get('MMSE', 'n/a'),
-        'etiv': metadata.get('eTIV', 'n/a'),
-        'asf': metadata.get('ASF', 'n/a'),
-        'nwbv': metadata.get('nWBV', 'n/a'),
-        'delay': metadata.get('DELAY', 'n/a')
-    })
+        # Read the whole file once and split key/value pairs in one pass
+        pairs = (line.split(':', 1)
+                 for line in txt_file.read_text().splitlines() if ':' in line)
+        raw = {key.strip(): value.strip() for key, value in pairs}
+
+        for key, value in raw.items():
+            if key in NUMERIC_KEYS:
+                if value.replace('.', '', 1).replace('-', '', 1).isdigit():
+                    metadata[key] = float(value) if '.' in value else int(value)
+                else:
+                    metadata[key] = value
+            elif key in TEXT_KEYS:
+                metadata[key] = value
 
-    # Add participant data (only once per subject)
-    if bids_subject_id not in participants_data:
-        participants_data[bids_subject_id] = {
-            'participant_id': bids_subject_id,
-            'sex': 'M' if metadata.get('M/F') == 'Male' else 'F' if metadata.get('M/F') == 'Female' else 'n/a',
-            'hand': 'R' if metadata.get('HAND') == 'Right' else 'L' if metadata.get('HAND') == 'Left' else 'n/a',
-            'education': metadata.get('EDUC', 'n/a'),
-            'ses': metadata.get('SES', 'n/a'),
-            'age_baseline': metadata.get('AGE', 'n/a') if session_num == 1 else participants_data.get(bids_subject_id, {}).get('age_baseline', 'n/a')
+    # We search recursively for .hdr files within the session directory to be more robust
+    hdr_files = sorted(find_hdr_files(orig_session_dir))
+
+    return subject_id, session_num, metadata, hdr_files
+
+
+def convert_hdr(task):
+    """Convert one .hdr to compressed NIfTI plus JSON sidecar.
+
+    Top-level so it pickles into process-pool workers: the gzip write in
+    nib.save is the CPU-heavy part and parallelizes across sessions.
+    Returns an error string, or None on success.
+    """
+    hdr_file, output_nii, output_json, metadata, label = task
+
+    try:
+        # Load Analyze format image
+        img = nib.load(hdr_file)
+
+        # Read data at its native dtype (int16) - get_fdata() would upcast
+        # to float64, an 8x memory blowup and far more bytes to compress
+        data = np.asanyarray(img.dataobj)
+        if data.ndim == 4 and data.shape[3] == 1:
+            data = data[:, :, :, 0]
+
+        # Convert to NIfTI and save as compressed, keeping the source dtype
+        nii_img = nib.Nifti1Image(data, img.affine)
+        nii_img.set_data_dtype(data.dtype)
+        nib.save(nii_img, output_nii)
+
+        # Create JSON sidecar
+        json_data = {
+            "Modality": "MR",
+            "MagneticFieldStrength": 1.5,
+            "Manufacturer": "Siemens",
+            "ManufacturersModelName": "Vision",
+            "PulseSequence": "MPRAGE",
+            "ScanningSequence": "GR\\IR",
+            "SequenceVariant": "SP\\MP",
+            "EchoTime": 0.004,
+            "RepetitionTime": 0.0095,
+            "InversionTime": 0.02,
+            "FlipAngle": 10,
+            "PhaseEncodingDirection": "j-",
+            "ConversionSoftware": "nibabel",
+            "ConversionSoftwareVersion": nib.__version__,
+            "SourceFormat": "Analyze7.5"
         }
 
-    # We search recursively for .hdr files within the session directory to be more robust
-    mpr_files_paths = sorted(list(orig_session_dir.glob('**/*nifti.hdr')))
-
-    if not mpr_files_paths:
-        error_msg = f"{bids_subject_id} {bids_session_id}: Nessun file '*.hdr' trovato in {orig_session_dir}"
-        conversion_errors.append(error_msg)
-        continue
-    
-    if i % 50 == 0 or i == 1:
-        print(f"  ✓ Trovati {len(mpr_files_paths)} file .hdr da convertire.")
-
-    for run_idx, hdr_file in enumerate(mpr_files_paths, 1):
-        mpr_base = hdr_file.name.replace('.hdr', '')
-
-        # Output filename with run number
-        if len(mpr_files_paths) > 1:
-            output_base = f"{bids_subject_id}_{bids_session_id}_run-{run_idx:02d}_T1w"
-        else:
-            output_base = f"{bids_subject_id}_{bids_session_id}_T1w"
-
-        output_nii = session_dir / f"{output_base}.nii.gz"
-        output_json = session_dir / f"{output_base}.json"
-
-        try:
-            # Load Analyze format image
-            img = nib.load(str(hdr_file))
-
-            # Get data and squeeze extra dimensions if needed
-            data = img.get_fdata()
-            if data.ndim == 4 and data.shape[3] == 1:
-                data = data[:, :, :, 0]
-
-            # Convert to NIfTI and save as compressed
-            nii_img = nib.Nifti1Image(data, img.affine)
-            nib.save(nii_img, str(output_nii))
-
-            # Create JSON sidecar
-            json_data = {
-                "Modality": "MR",
-                "MagneticFieldStrength": 1.5,
-                "Manufacturer": "Siemens",
-                "ManufacturersModelName": "Vision",
-                "PulseSequence": "MPRAGE",
-                "ScanningSequence": "GR\\IR",
-                "SequenceVariant": "SP\\MP",
-                "EchoTime": 0.004,
-                "RepetitionTime": 0.0095,
-                "InversionTime": 0.02,
-                "FlipAngle": 10,
-                "PhaseEncodingDirection": "j-",
-                "ConversionSoftware": "nibabel",
-                "ConversionSoftwareVersion": nib.__version__,
-                "SourceFormat": "Analyze7.5"
+        # Add session metadata
+        if metadata:
+            json_data["SessionMetadata"] = {
+                "Age": metadata.get('AGE'),
+                "Sex": metadata.get('M/F'),
+                "CDR": metadata.get('CDR'),
+                "MMSE": metadata.get('MMSE'),
+                "eTIV": metadata.get('eTIV'),
+                "ASF": metadata.get('ASF'),
+                "nWBV": metadata.get('nWBV'),
+                "Delay": metadata.get('DELAY')
             }
 
-            # Add session metadata
-            if metadata:
-                json_data["SessionMetadata"] = {
-                    "Age": metadata.get('AGE'),
-                    "Sex": metadata.get('M/F'),
-                    "CDR": metadata.get('CDR'),
-                    "MMSE": metadata.get('MMSE'),
-                    "eTIV": metadata.get('eTIV'),
-                    "ASF": metadata.get('ASF'),
-                    "nWBV": metadata.get('nWBV'),
-                    "Delay": metadata.get('DELAY')
-                }
-
-            with open(output_json, 'w') as f:
-                json.dump(json_data, f, indent=2)
-
-        except Exception as e:
-            error_msg = f"{bids_subject_id} {bids_session_id} run {run_idx}: {type(e).__name__}: {e}"
+        write_json(output_json, json_data)
+
+    except Exception as e:
+        return f"{label}: {type(e).__name__}: {e}"
+
+    return None
+
+
+def main():
+    print("="*80)
+    print("OASIS-2: Converting Analyze 7.5 to BIDS (Longitudinal)")
+    print("="*80)
+
+    # Get list of sessions
+    if not Path(oasis2_raw).exists():
+        print(f"\n✗ ERRORE: La directory di input non esiste: {oasis2_raw}")
+        print("Verifica che il percorso sia corretto e che il disco sia montato.")
+        exit(1)
+
+    sessions = sorted([d for d in os.listdir(oasis2_raw) if d.startswith('OAS2_')])
+    print(f"\nFound {len(sessions)} imaging sessions")
+
+    if not sessions:
+        print("\n⚠ ATTENZIONE: Nessuna sessione di imaging trovata nella directory di input.")
+        print(f"Controlla che la directory '{oasis2_raw}' contenga le cartelle delle sessioni (es. 'OAS2_0001_MR1').")
+
+    # Storage for participants and sessions data
+    participant_rows = []
+    sessions_data = []
+    conversion_errors = []
+    convert_tasks = []
+
+    # Metadata parsing and .hdr discovery are pure I/O: overlap them
+    # across sessions with a thread pool
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        parsed = list(executor.map(parse_session, sessions))
+
+    # Collect metadata and build the conversion task list
+    for i, (session, result) in enumerate(zip(sessions, parsed), 1):
+        if result is None:
+            conversion_errors.append(f"Cannot parse session ID: {session}")
+            continue
+
+        subject_id, session_num, metadata, hdr_files = result
+        bids_subject_id = f"sub-{subject_id}"
+        bids_session_id = f"ses-{session_num:02d}"
+
+        if i % 50 == 0 or i == 1:
+            print(f"\n[{i}/{len(sessions)}] Processing {subject_id} {bids_session_id}...")
+
+        # Create BIDS directory structure (string joins: no PurePath
+        # allocations in the per-session loop)
+        session_dir = os.path.join(oasis2_bids, bids_subject_id, bids_session_id, "anat")
+        _ensure_dir(session_dir)
+
+        # Add session data
+        sessions_data.append({
+            'participant_id': bids_subject_id,
+            'session_id': bids_session_id,
+            'age': metadata.get('AGE', 'n/a'),
+            'cdr': metadata.get('CDR', 'n/a'),
+            'mmse': metadata.get('MMSE', 'n/a'),
+            'etiv': metadata.get('eTIV', 'n/a'),
+            'asf': metadata.get('ASF', 'n/a'),
+            'nwbv': metadata.get('nWBV', 'n/a'),
+            'delay': metadata.get('DELAY', 'n/a')
+        })
+
+        # Raw per-session participant fields; baseline selection and the
+        # Male/Female -> M/F translations happen vectorized afterwards
+        participant_rows.append({
+            'participant_id': bids_subject_id,
+            'session_id': bids_session_id,
+            'sex': metadata.get('M/F'),
+            'hand': metadata.get('HAND'),
+            'education': metadata.get('EDUC', 'n/a'),
+            'ses': metadata.get('SES', 'n/a'),
+            'age': metadata.get('AGE', 'n/a')
+        })
+
+        if not hdr_files:
+            error_msg = f"{bids_subject_id} {bids_session_id}: Nessun file '*.hdr' trovato in {Path(oasis2_raw) / session}"
             conversion_errors.append(error_msg)
-            print(f"  ✗ Error: {error_msg}")
-
-print("\n" + "="*80)
-print("Creating participants.tsv")
-print("="*80)
-
-# Create participants dataframe
-participants_df = pd.DataFrame(list(participants_data.values()))
-participants_df = participants_df.sort_values('participant_id').reset_index(drop=True)
-
-# Save participants.tsv
-participants_file = Path(oasis2_bids) / "participants.tsv"
-participants_df.to_csv(participants_file, sep='\t', index=False)
-
-print(f"\n✓ Saved participants.tsv: {len(participants_df)} subjects")
-
-# Create participants.json descriptor
-participants_json = {
-    "participant_id": {
-        "Description": "Unique participant identifier",
-        "LongName": "Participant ID"
-    },
-    "age_baseline": {
-        "Description": "Age of participant at baseline (first session)",
-        "Units": "years",
-        "LongName": "Age at Baseline"
-    },
-    "sex": {
-        "Description": "Biological sex of the participant",
-        "Levels": {
-            "M": "Male",
-            "F": "Female"
+            continue
+
+        if i % 50 == 0 or i == 1:
+            print(f"  ✓ Trovati {len(hdr_files)} file .hdr da convertire.")
+
+        for run_idx, hdr_file in enumerate(hdr_files, 1):
+            # Output filename with run number
+            if len(hdr_files) > 1:
+                output_base = f"{bids_subject_id}_{bids_session_id}_run-{run_idx:02d}_T1w"
+            else:
+                output_base = f"{bids_subject_id}_{bids_session_id}_T1w"
+
+            convert_tasks.append((
+                hdr_file,
+                os.path.join(session_dir, f"{output_base}.nii.gz"),
+                os.path.join(session_dir, f"{output_base}.json"),
+                metadata,
+                f"{bids_subject_id} {bids_session_id} run {run_idx}"
+            ))
+
+    # The compressed NIfTI writes are CPU-bound on gzip: run them in a
+    # process pool, one task per .hdr file
+    print(f"\nConverting {len(convert_tasks)} .hdr files in parallel...")
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for error_msg in executor.map(convert_hdr, convert_tasks, chunksize=4):
+            if error_msg:
+                conversion_errors.append(error_msg)
+                print(f"  ✗ Error: {error_msg}")
+
+    print("\n" + "="*80)
+    print("Creating participants.tsv")
+    print("="*80)
+
+    # Derive participants from the earliest session per subject: one sort +
+    # drop_duplicates pass instead of per-session dict bookkeeping. This also
+    # keeps age_baseline correct for subjects whose first session on disk is
+    # not MR1.
+    baseline = (pd.DataFrame(participant_rows)
+                .sort_values('session_id')
+                .drop_duplicates('participant_id', keep='first'))
+    participants_df = pd.DataFrame({
+        'participant_id': baseline['participant_id'],
+        'sex': baseline['sex'].map({'Male': 'M', 'Female': 'F'}).fillna('n/a'),
+        'hand': baseline['hand'].map({'Right': 'R', 'Left': 'L'}).fillna('n/a'),
+        'education': baseline['education'],
+        'ses': baseline['ses'],
+        'age_baseline': baseline['age']
+    })
+    participants_df = participants_df.sort_values('participant_id').reset_index(drop=True)
+
+    # Save participants.tsv
+    participants_file = Path(oasis2_bids) / "participants.tsv"
+    participants_df.to_csv(participants_file, sep='\t', index=False)
+
+    print(f"\n✓ Saved participants.tsv: {len(participants_df)} subjects")
+
+    # Create participants.json descriptor
+    participants_json = {
+        "participant_id": {
+            "Description": "Unique participant identifier",
+            "LongName": "Participant ID"
         },
-        "LongName": "Sex"
-    },
-    "hand": {
-        "Description": "Handedness of participant",
-        "Levels": {
-            "R": "Right-handed",
-            "L": "Left-handed"
+        "age_baseline": {
+            "Description": "Age of participant at baseline (first session)",
+            "Units": "years",
+            "LongName": "Age at Baseline"
         },
-        "LongName": "Handedness"
-    },
-    "education": {
-        "Description": "Years of education completed",
-        "Units": "years",
-        "LongName": "Years of Education"
-    },
-    "ses": {
-        "Description": "Socioeconomic status (Hollingshead Index of Social Position)",
-        "LongName": "Socioeconomic Status"
+        "sex": {
+            "Description": "Biological sex of the participant",
+            "Levels": {
+                "M": "Male",
+                "F": "Female"
+            },
+            "LongName": "Sex"
+        },
+        "hand": {
+            "Description": "Handedness of participant",
+            "Levels": {
+                "R": "Right-handed",
+                "L": "Left-handed"
+            },
+            "LongName": "Handedness"
+        },
+        "education": {
+            "Description": "Years of education completed",
+            "Units": "years",
+            "LongName": "Years of Education"
+        },
+        "ses": {
+            "Description": "Socioeconomic status (Hollingshead Index of Social Position)",
+            "LongName": "Socioeconomic Status"
+        }
     }
-}
-
-participants_json_file = Path(oasis2_bids) / "participants.json"
-with open(participants_json_file, 'w') as f:
-    json.dump(participants_json, f, indent=4)
-
-print(f"✓ Saved participants.json")
-
-print("\n" + "="*80)
-print("Creating sessions.tsv files")
-print("="*80)
-
-# Group sessions by participant
-sessions_df = pd.DataFrame(sessions_data)
-
-# Create sessions.tsv for each subject
-for subject_id in participants_df['participant_id']:
-    subject_sessions = sessions_df[sessions_df['participant_id'] == subject_id].copy()
-    subject_sessions = subject_sessions.drop('participant_id', axis=1)
-    subject_sessions = subject_sessions.sort_values('session_id').reset_index(drop=True)
-
-    sessions_file = Path(oasis2_bids) / subject_id / f"{subject_id}_sessions.tsv"
-    subject_sessions.to_csv(sessions_file, sep='\t', index=False)
-
-print(f"✓ Saved sessions.tsv for {len(participants_df)} subjects")
-
-# Create sessions.json descriptor (applies to all sessions.tsv files)
-sessions_json = {
-    "session_id": {
-        "Description": "Session identifier",
-        "LongName": "Session ID"
-    },
-    "age": {
-        "Description": "Age of participant at this session",
-        "Units": "years",
-        "LongName": "Age"
-    },
-    "cdr": {
-        "Description": "Clinical Dementia Rating (CDR) global score at this session",
-        "Levels": {
-            "0": "No dementia",
-            "0.5": "Very mild dementia",
-            "1": "Mild dementia",
-            "2": "Moderate dementia"
+
+    write_json(Path(oasis2_bids) / "participants.json", participants_json)
+
+    print(f"✓ Saved participants.json")
+
+    print("\n" + "="*80)
+    print("Creating sessions.tsv files")
+    print("="*80)
+
+    # Group sessions by participant
+    sessions_df = pd.DataFrame(sessions_data)
+
+    # Create sessions.tsv for each subject: groupby yields each subject's
+    # subframe in one pass instead of re-filtering the full frame per subject
+    for subject_id, subject_sessions in sessions_df.groupby('participant_id', sort=True):
+        subject_sessions = subject_sessions.drop('participant_id', axis=1)
+        subject_sessions = subject_sessions.sort_values('session_id').reset_index(drop=True)
+
+        sessions_file = Path(oasis2_bids) / subject_id / f"{subject_id}_sessions.tsv"
+        subject_sessions.to_csv(sessions_file, sep='\t', index=False)
+
+    print(f"✓ Saved sessions.tsv for {len(participants_df)} subjects")
+
+    # Create sessions.json descriptor (applies to all sessions.tsv files)
+    sessions_json = {
+        "session_id": {
+            "Description": "Session identifier",
+            "LongName": "Session ID"
         },
-        "LongName": "Clinical Dementia Rating"
-    },
-    "mmse": {
-        "Description": "Mini-Mental State Examination score at this session",
-        "LongName": "MMSE"
-    },
-    "etiv": {
-        "Description": "Estimated Total Intracranial Volume",
-        "Units": "mm³",
-        "LongName": "Estimated Total Intracranial Volume"
-    },
-    "asf": {
-        "Description": "Atlas Scaling Factor (volume scaling factor required to match each subject to the atlas)",
-        "LongName": "Atlas Scaling Factor"
-    },
-    "nwbv": {
-        "Description": "Normalized Whole Brain Volume (ratio of brain volume to intracranial volume)",
-        "LongName": "Normalized Whole Brain Volume"
-    },
-    "delay": {
-        "Description": "Time delay from baseline scan (in days)",
-        "Units": "days",
-        "LongName": "Delay from Baseline"
+        "age": {
+            "Description": "Age of participant at this session",
+            "Units": "years",
+            "LongName": "Age"
+        },
+        "cdr": {
+            "Description": "Clinical Dementia Rating (CDR) global score at this session",
+            "Levels": {
+                "0": "No dementia",
+                "0.5": "Very mild dementia",
+                "1": "Mild dementia",
+                "2": "Moderate dementia"
+            },
+            "LongName": "Clinical Dementia Rating"
+        },
+        "mmse": {
+            "Description": "Mini-Mental State Examination score at this session",
+            "LongName": "MMSE"
+        },
+        "etiv": {
+            "Description": "Estimated Total Intracranial Volume",
+            "Units": "mm³",
+            "LongName": "Estimated Total Intracranial Volume"
+        },
+        "asf": {
+            "Description": "Atlas Scaling Factor (volume scaling factor required to match each subject to the atlas)",
+            "LongName": "Atlas Scaling Factor"
+        },
+        "nwbv": {
+            "Description": "Normalized Whole Brain Volume (ratio of brain volume to intracranial volume)",
+            "LongName": "Normalized Whole Brain Volume"
+        },
+        "delay": {
+            "Description": "Time delay from baseline scan (in days)",
+            "Units": "days",
+            "LongName": "Delay from Baseline"
+        }
     }
-}
-
-sessions_json_file = Path(oasis2_bids) / "sessions.json"
-with open(sessions_json_file, 'w') as f:
-    json.dump(sessions_json, f, indent=4)
-
-print(f"✓ Saved sessions.json")
-
-# Print summary
-print("\n" + "="*80)
-print("CONVERSION SUMMARY")
-print("="*80)
-print(f"\nTotal subjects: {len(participants_df)}")
-print(f"Total sessions: {len(sessions_df)}")
-print(f"Sessions per subject: {len(sessions_df)/len(participants_df):.1f} average")
-
-if conversion_errors:
-    print(f"\n⚠ Conversion errors: {len(conversion_errors)}")
-    print("First 5 errors:")
-    for err in conversion_errors[:5]:
-        print(f"  - {err}")
-
-print(f"\nAge at baseline:")
-age_data = pd.to_numeric(participants_df['age_baseline'], errors='coerce')
-print(f"  Range: {age_data.min():.0f} - {age_data.max():.0f} years")
-print(f"  Mean: {age_data.mean():.1f} ± {age_data.std():.1f}")
-
-print(f"\nSex distribution:")
-for sex in ['M', 'F']:
-    count = (participants_df['sex'] == sex).sum()
-    print(f"  {sex}: {count} ({count/len(participants_df)*100:.1f}%)")
-
-print(f"\nCDR distribution at baseline:")
-baseline_sessions = sessions_df[sessions_df['session_id'] == 'ses-01']
-cdr_counts = baseline_sessions['cdr'].value_counts().sort_index()
-for cdr, count in cdr_counts.items():
-    if cdr != 'n/a':
-        print(f"  CDR {cdr}: {count} ({count/len(baseline_sessions)*100:.1f}%)")
-
-print(f"\nMMSE at baseline:")
-mmse_data = pd.to_numeric(baseline_sessions['mmse'], errors='coerce')
-print(f"  Range: {mmse_data.min():.0f} - {mmse_data.max():.0f}")
-print(f"  Mean: {mmse_data.mean():.1f} ± {mmse_data.std():.1f}")
-
-# Count sessions per subject
-sessions_per_subject = sessions_df.groupby('participant_id').size()
-print(f"\nSessions per subject distribution:")
-for n_sessions in sorted(sessions_per_subject.unique()):
-    count = (sessions_per_subject == n_sessions).sum()
-    print(f"  {n_sessions} sessions: {count} subjects ({count/len(participants_df)*100:.1f}%)")
-
-print("\n" + "="*80)
-print("OASIS-2 conversion complete!")
-print("="*80)
+
+    write_json(Path(oasis2_bids) / "sessions.json", sessions_json)
+
+    print(f"✓ Saved sessions.json")
+
+    # Print summary
+    print("\n" + "="*80)
+    print("CONVERSION SUMMARY")
+    print("="*80)
+    print(f"\nTotal subjects: {len(participants_df)}")
+    print(f"Total sessions: {len(sessions_df)}")
+    print(f"Sessions per subject: {len(sessions_df)/len(participants_df):.1f} average")
+
+    if conversion_errors:
+        print(f"\n⚠ Conversion errors: {len(conversion_errors)}")
+        print("First 5 errors:")
+        for err in conversion_errors[:5]:
+            print(f"  - {err}")
+
+    # One agg pass per column instead of separate min/max/mean/std scans
+    print(f"\nAge at baseline:")
+    age_stats = pd.to_numeric(participants_df['age_baseline'], errors='coerce').agg(
+        ['min', 'max', 'mean', 'std'])
+    print(f"  Range: {age_stats['min']:.0f} - {age_stats['max']:.0f} years")
+    print(f"  Mean: {age_stats['mean']:.1f} ± {age_stats['std']:.1f}")
+
+    print(f"\nSex distribution:")
+    sex_counts = participants_df['sex'].value_counts()
+    for sex in ['M', 'F']:
+        count = sex_counts.get(sex, 0)
+        print(f"  {sex}: {count} ({count/len(participants_df)*100:.1f}%)")
+
+    print(f"\nCDR distribution at baseline:")
+    baseline_sessions = sessions_df[sessions_df['session_id'] == 'ses-01']
+    # Coerce once so the counts sort numerically; 'n/a' drops out as NaN
+    cdr_counts = (pd.to_numeric(baseline_sessions['cdr'], errors='coerce')
+                  .dropna().value_counts().sort_index())
+    cdr_pcts = cdr_counts * (100.0 / len(baseline_sessions))
+    for cdr, count in cdr_counts.items():
+        print(f"  CDR {cdr}: {count} ({cdr_pcts[cdr]:.1f}%)")
+
+    print(f"\nMMSE at baseline:")
+    mmse_stats = pd.to_numeric(baseline_sessions['mmse'], errors='coerce').agg(
+        ['min', 'max', 'mean', 'std'])
+    print(f"  Range: {mmse_stats['min']:.0f} - {mmse_stats['max']:.0f}")
+    print(f"  Mean: {mmse_stats['mean']:.1f} ± {mmse_stats['std']:.1f}")
+
+    # Count sessions per subject
+    sessions_per_subject = sessions_df.groupby('participant_id').size()
+    print(f"\nSessions per subject distribution:")
+    for n_sessions, count in sessions_per_subject.value_counts().sort_index().items():
+        print(f"  {n_sessions} sessions: {count} subjects ({count/len(participants_df)*100:.1f}%)")
+
+    print("\n" + "="*80)
+    print("OASIS-2 conversion complete!")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
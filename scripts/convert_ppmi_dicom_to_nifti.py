@@ -17,6 +17,8 @@ import logging
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from tqdm import tqdm
 
 # Configuration
@@ -24,6 +26,7 @@ DICOM_ROOT = Path("/mnt/db_ext/RAW/PPMI/PPMI")
 METADATA_FILE = Path("/mnt/db_ext/RAW/PPMI/Participant_Status_06Nov2025.csv")
 DEMOGRAPHICS_FILE = Path("/mnt/db_ext/RAW/PPMI/Demographics_06Nov2025.csv")
 OUTPUT_ROOT = Path("/mnt/db_ext/RAW/PPMI/nifti")
+OUTPUT_ROOT_S = str(OUTPUT_ROOT)  # plain-string root for hot-loop path joins
 LOG_FILE = Path("/home/mario/Repository/Normal_Alzeihmer/logs/ppmi_conversion.log")
 
 # T1 sequence patterns (case-insensitive matching)
@@ -41,6 +44,14 @@ EXCLUDE_PATTERNS = [
     r".*calibration.*",
 ]
 
+# Compiled union of the patterns above: one C-level regex call per check
+# instead of looping re.match over each pattern string
+_T1_RE = re.compile('|'.join(T1_PATTERNS), re.IGNORECASE)
+_EXCLUDE_RE = re.compile('|'.join(EXCLUDE_PATTERNS), re.IGNORECASE)
+
+# Session date pattern YYYY-MM-DD at the start of timestamp directory names
+_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
 # Priority order for selecting best T1 sequence when multiple are available
 SEQUENCE_PRIORITY = [
     "3D_T1-weighted",
@@ -56,6 +67,17 @@ SEQUENCE_PRIORITY = [
 ]
 
 
+# Directories already created this run (per process): repeated sequences in
+# the same session skip the mkdir/stat syscalls
+_created_dirs = set()
+
+
+def _ensure_dir(path: str):
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+
+
 def setup_logging():
     """Setup logging configuration"""
     LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -71,12 +93,23 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 
+def _read_csv_fast(file_path, usecols):
+    """Read only the needed columns, with the multi-threaded pyarrow
+    engine when available."""
+    try:
+        return pd.read_csv(file_path, usecols=usecols, engine='pyarrow')
+    except (ImportError, ValueError):
+        return pd.read_csv(file_path, usecols=usecols)
+
+
 def load_healthy_controls() -> pd.DataFrame:
     """Load healthy control subjects from metadata"""
     logger = logging.getLogger(__name__)
     logger.info(f"Loading metadata from {METADATA_FILE}")
 
-    df = pd.read_csv(METADATA_FILE)
+    df = _read_csv_fast(METADATA_FILE,
+                        usecols=['PATNO', 'COHORT', 'COHORT_DEFINITION',
+                                 'ENROLL_STATUS', 'ENROLL_AGE'])
 
     # Filter for healthy controls (COHORT=2) and enrolled status
     healthy = df[
@@ -94,7 +127,9 @@ def load_demographics() -> pd.DataFrame:
     logger.info(f"Loading demographics from {DEMOGRAPHICS_FILE}")
 
     try:
-        df = pd.read_csv(DEMOGRAPHICS_FILE)
+        df = _read_csv_fast(DEMOGRAPHICS_FILE,
+                            usecols=['PATNO', 'SEX', 'BIRTHDT', 'RACE',
+                                     'HISPLAT', 'HANDED'])
         logger.info(f"Loaded demographics for {len(df)} subjects")
         return df
     except Exception as e:
@@ -102,82 +137,98 @@ def load_demographics() -> pd.DataFrame:
         return pd.DataFrame()
 
 
+@lru_cache(maxsize=None)
 def is_t1_sequence(sequence_name: str) -> bool:
-    """Check if sequence name matches T1 patterns"""
-    sequence_lower = sequence_name.lower()
+    """Check if sequence name matches T1 patterns
 
+    Sequence directory names repeat across subjects, so after warmup the
+    check is a dict lookup.
+    """
     # Check exclude patterns first
-    for pattern in EXCLUDE_PATTERNS:
-        if re.match(pattern, sequence_lower):
-            return False
+    if _EXCLUDE_RE.match(sequence_name):
+        return False
 
-    # Check T1 patterns
-    for pattern in T1_PATTERNS:
-        if re.match(pattern, sequence_lower, re.IGNORECASE):
-            return True
+    return _T1_RE.match(sequence_name) is not None
 
-    return False
 
+# Lowercased priorities, paired with their rank once at import
+_PRIORITY_LOWER = [(idx, seq.lower()) for idx, seq in enumerate(SEQUENCE_PRIORITY)]
 
+
+@lru_cache(maxsize=None)
 def get_sequence_priority(sequence_name: str) -> int:
-    """Get priority score for sequence (lower is better)"""
-    for idx, priority_seq in enumerate(SEQUENCE_PRIORITY):
-        if priority_seq.lower() in sequence_name.lower():
+    """Get priority score for sequence (lower is better)
+
+    Memoized: PPMI has only a few dozen distinct sequence names.
+    """
+    name_lower = sequence_name.lower()
+    for idx, priority_seq in _PRIORITY_LOWER:
+        if priority_seq in name_lower:
             return idx
     return len(SEQUENCE_PRIORITY)  # Lowest priority for unknown sequences
 
 
-def find_t1_sequences(subject_id: str) -> List[Dict[str, any]]:
-    """Find all T1 sequences for a subject"""
+def find_t1_sequences(subject_id: str, subjects_on_disk: set) -> List[Dict[str, any]]:
+    """Find all T1 sequences for a subject
+
+    subjects_on_disk is the cached DICOM_ROOT listing, so missing subjects
+    are rejected with a set lookup instead of a per-subject stat call.
+    """
     logger = logging.getLogger(__name__)
     subject_dir = DICOM_ROOT / str(subject_id)
 
-    if not subject_dir.exists():
+    if str(subject_id) not in subjects_on_disk:
         logger.warning(f"Subject directory not found: {subject_dir}")
         return []
 
     t1_sequences = []
 
-    # Iterate through sequence directories
-    for seq_dir in subject_dir.iterdir():
-        if not seq_dir.is_dir():
-            continue
-
-        seq_name = seq_dir.name
-        if not is_t1_sequence(seq_name):
-            continue
-
-        # Find timestamp directories (sessions)
-        for timestamp_dir in seq_dir.iterdir():
-            if not timestamp_dir.is_dir():
-                continue
-
-            # Extract session date from timestamp
-            timestamp_name = timestamp_dir.name
-            session_date = extract_session_date(timestamp_name)
-
-            # Find image directory (contains DICOM files)
-            dicom_dirs = list(timestamp_dir.iterdir())
-            if not dicom_dirs:
+    # Iterate through sequence directories with os.scandir: DirEntry.is_dir()
+    # reads the cached d_type, so no per-entry stat() or Path allocation
+    with os.scandir(subject_dir) as seq_it:
+        for seq_entry in seq_it:
+            if not seq_entry.is_dir(follow_symlinks=False):
                 continue
 
-            # Usually there's one subdirectory with the actual DICOM files
-            dicom_dir = dicom_dirs[0] if len(dicom_dirs) == 1 else timestamp_dir
-
-            # Check if DICOM files exist
-            dicom_files = list(dicom_dir.glob("*.dcm"))
-            if not dicom_files:
+            seq_name = seq_entry.name
+            if not is_t1_sequence(seq_name):
                 continue
 
-            t1_sequences.append({
-                'subject_id': subject_id,
-                'sequence_name': seq_name,
-                'session_date': session_date,
-                'timestamp': timestamp_name,
-                'dicom_path': dicom_dir,
-                'num_files': len(dicom_files),
-                'priority': get_sequence_priority(seq_name)
-            })
+            # Find timestamp directories (sessions)
+            with os.scandir(seq_entry.path) as ts_it:
+                for timestamp_entry in ts_it:
+                    if not timestamp_entry.is_dir(follow_symlinks=False):
+                        continue
+
+                    # Extract session date from timestamp
+                    timestamp_name = timestamp_entry.name
+                    session_date = extract_session_date(timestamp_name)
+
+                    # Find image directory (contains DICOM files)
+                    with os.scandir(timestamp_entry.path) as img_it:
+                        dicom_dirs = [e.path for e in img_it]
+                    if not dicom_dirs:
+                        continue
+
+                    # Usually there's one subdirectory with the actual DICOM files
+                    dicom_path = dicom_dirs[0] if len(dicom_dirs) == 1 else timestamp_entry.path
+
+                    # Count DICOM files from bare names: os.listdir returns
+                    # strings only, the cheapest way to enumerate a directory
+                    num_files = sum(1 for name in os.listdir(dicom_path)
+                                    if name.endswith('.dcm'))
+                    if not num_files:
+                        continue
+
+                    t1_sequences.append({
+                        'subject_id': subject_id,
+                        'sequence_name': seq_name,
+                        'session_date': session_date,
+                        'timestamp': timestamp_name,
+                        'dicom_path': Path(dicom_path),
+                        'num_files': num_files,
+                        'priority': get_sequence_priority(seq_name)
+                    })
 
     return t1_sequences
 
@@ -190,7 +241,7 @@ def extract_session_date(timestamp_str: str) -> str:
         '2021-05-17_10_47_24.0' -> '20210517'
     """
     # Try to extract date pattern YYYY-MM-DD
-    match = re.match(r'(\d{4})-(\d{2})-(\d{2})', timestamp_str)
+    match = _DATE_RE.match(timestamp_str)
     if match:
         return f"{match.group(1)}{match.group(2)}{match.group(3)}"
 
@@ -234,7 +285,7 @@ def select_best_sequences(sequences: List[Dict]) -> List[Dict]:
     return selected
 
 
-def convert_to_nifti(sequence_info: Dict, output_dir: Path) -> bool:
+def convert_to_nifti(sequence_info: Dict, output_dir: str) -> bool:
     """Convert DICOM sequence to NIfTI using dcm2niix"""
     logger = logging.getLogger(__name__)
 
@@ -250,12 +301,12 @@ def convert_to_nifti(sequence_info: Dict, output_dir: Path) -> bool:
         filename = f"sub-{subject_id}_ses-{session_date}_T1w"
 
     # Create output directory
-    output_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(output_dir)
 
     # Run dcm2niix
     cmd = [
         'dcm2niix',
-        '-o', str(output_dir),      # Output directory
+        '-o', output_dir,            # Output directory
         '-f', filename,              # Output filename
         '-z', 'y',                   # Compress (gzip)
         '-b', 'y',                   # Save BIDS sidecar JSON
@@ -265,31 +316,37 @@ def convert_to_nifti(sequence_info: Dict, output_dir: Path) -> bool:
     ]
 
     try:
-        result = subprocess.run(
+        # Discard dcm2niix output on the happy path: capturing it costs a
+        # pipe read plus string decode per call and is only read on failure
+        subprocess.run(
             cmd,
-            capture_output=True,
-            text=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             check=True
         )
 
-        # Check if output files were created
-        nifti_file = output_dir / f"{filename}.nii.gz"
-        json_file = output_dir / f"{filename}.json"
+        # Check if output files were created (string joins: no PurePath
+        # allocation per conversion)
+        nifti_file = os.path.join(output_dir, f"{filename}.nii.gz")
+        json_file = os.path.join(output_dir, f"{filename}.json")
 
-        if nifti_file.exists():
+        if os.path.exists(nifti_file):
             logger.info(f"✓ Converted: {filename}")
             return True
         else:
+            diag = subprocess.run(cmd, capture_output=True, text=True)
             logger.error(f"✗ Conversion failed (no output): {filename}")
-            logger.error(f"  STDOUT: {result.stdout}")
-            logger.error(f"  STDERR: {result.stderr}")
+            logger.error(f"  STDOUT: {diag.stdout}")
+            logger.error(f"  STDERR: {diag.stderr}")
             return False
 
     except subprocess.CalledProcessError as e:
+        # Rare failure path: re-run once with output captured for the log
+        diag = subprocess.run(cmd, capture_output=True, text=True)
         logger.error(f"✗ Conversion failed: {filename}")
         logger.error(f"  Error: {e}")
-        logger.error(f"  STDOUT: {e.stdout}")
-        logger.error(f"  STDERR: {e.stderr}")
+        logger.error(f"  STDOUT: {diag.stdout}")
+        logger.error(f"  STDERR: {diag.stderr}")
         return False
     except Exception as e:
         logger.error(f"✗ Unexpected error converting {filename}: {e}")
@@ -332,12 +389,17 @@ def create_bids_metadata(healthy_subjects: pd.DataFrame, demographics: pd.DataFr
     # Create participants.tsv
     participants_data = []
 
+    # Index demographics by PATNO once: each subject lookup becomes an O(1)
+    # dict access instead of a full-frame boolean scan
+    if demographics.empty:
+        demo_by_patno = {}
+    else:
+        demo_by_patno = (demographics.drop_duplicates(subset='PATNO')
+                         .set_index('PATNO').to_dict('index'))
+
     for _, subject in healthy_subjects.iterrows():
         patno = subject['PATNO']
 
-        # Get demographics if available
-        demo = demographics[demographics['PATNO'] == patno]
-
         participant = {
             'participant_id': f"sub-{patno}",
             'cohort': 'Healthy Control',
@@ -345,8 +407,9 @@ def create_bids_metadata(healthy_subjects: pd.DataFrame, demographics: pd.DataFr
             'enroll_age': subject.get('ENROLL_AGE', 'N/A'),
         }
 
-        if not demo.empty:
-            demo_row = demo.iloc[0]
+        # Get demographics if available
+        demo_row = demo_by_patno.get(patno)
+        if demo_row is not None:
             participant['sex'] = demo_row.get('SEX', 'N/A')
             participant['age'] = demo_row.get('BIRTHDT', 'N/A')  # Will need calculation
             participant['race'] = demo_row.get('RACE', 'N/A')
@@ -444,36 +507,46 @@ def main():
 
     subjects_to_process = healthy_subjects['PATNO'].tolist()
 
-    for subject_id in tqdm(subjects_to_process, desc="Converting subjects"):
-        # Find T1 sequences
-        t1_sequences = find_t1_sequences(subject_id)
-
-        if not t1_sequences:
-            stats['subjects_without_dicom'] += 1
-            logger.debug(f"No T1 sequences found for subject {subject_id}")
-            continue
-
-        stats['subjects_with_dicom'] += 1
-
-        # Select best sequences
-        selected = select_best_sequences(t1_sequences)
-        stats['total_sequences'] += len(selected)
+    # One DICOM_ROOT listing replaces an existence stat per subject
+    subjects_on_disk = set(os.listdir(DICOM_ROOT))
+
+    # Pipeline discovery and conversion: sequences are submitted to the
+    # worker pool as soon as they are found, so the filesystem walk
+    # (producer) overlaps with the dcm2niix runs (consumers) instead of
+    # finishing before the first conversion starts
+    n_workers = max(os.cpu_count() // 2, 1)
+    logger.info(f"Converting with {n_workers} workers, overlapped with discovery")
+
+    futures = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for subject_id in tqdm(subjects_to_process, desc="Scanning subjects"):
+            # Find T1 sequences
+            t1_sequences = find_t1_sequences(subject_id, subjects_on_disk)
+
+            if not t1_sequences:
+                stats['subjects_without_dicom'] += 1
+                logger.debug(f"No T1 sequences found for subject {subject_id}")
+                continue
 
-        # Count unique sessions
-        unique_sessions = len(set(seq['session_date'] for seq in selected))
-        stats['total_sessions'] += unique_sessions
+            stats['subjects_with_dicom'] += 1
 
-        # Convert each sequence
-        for seq in selected:
-            session_date = seq['session_date']
+            # Select best sequences
+            selected = select_best_sequences(t1_sequences)
+            stats['total_sequences'] += len(selected)
 
-            # Create output directory: sub-{PATNO}/ses-{date}/anat/
-            output_dir = OUTPUT_ROOT / f"sub-{subject_id}" / f"ses-{session_date}" / "anat"
+            # Count unique sessions
+            unique_sessions = len(set(seq['session_date'] for seq in selected))
+            stats['total_sessions'] += unique_sessions
 
-            # Convert
-            success = convert_to_nifti(seq, output_dir)
+            # Output directory: sub-{PATNO}/ses-{date}/anat/
+            for seq in selected:
+                output_dir = os.path.join(OUTPUT_ROOT_S, f"sub-{subject_id}",
+                                          f"ses-{seq['session_date']}", "anat")
+                futures.append(executor.submit(convert_to_nifti, seq, output_dir))
 
-            if success:
+        for future in tqdm(as_completed(futures), total=len(futures),
+                           desc="Converting sequences"):
+            if future.result():
                 stats['successful_conversions'] += 1
             else:
                 stats['failed_conversions'] += 1
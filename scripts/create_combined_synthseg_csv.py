@@ -4,137 +4,116 @@ Create combined synthseg processing CSV for OASIS + SRPBS
 Following the same logic used for OASIS datasets
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
 
+
+def baseline_t1w_scans(bids_root, pattern, subject_idx):
+    '''First T1w per subject from a single glob over the whole BIDS tree.
+
+    One bulk walk replaces the nested per-subject/per-session scandirs;
+    sorted paths order by (subject, session, run), so the first hit per
+    subject is the baseline scan.
+    '''
+    scans = []
+    seen = set()
+    for t1w in sorted(bids_root.glob(pattern)):
+        subject = t1w.parts[subject_idx]
+        if subject not in seen:
+            seen.add(subject)
+            scans.append((subject, t1w))
+    return scans
+
+
 print('='*80)
 print('CREATING COMBINED SYNTHSEG PROCESSING CSV (OASIS + SRPBS)')
 print('='*80)
 
-processing_list = []
+# Colonne accumulate come liste parallele (SoA): pandas costruisce il
+# DataFrame direttamente dalle colonne, senza un dict per riga da
+# trasporre e tipizzare a posteriori
+subject_ids = []
+input_images = []
+output_dirs = []
+dataset_labels = []
 
 # ============================================================================
 # OASIS-1: Cross-sectional (1 sessione per soggetto, prendi primo run)
 # ============================================================================
 print('\n### OASIS-1 ###')
 oasis1_bids = Path('/mnt/db_ext/RAW/oasis/OASIS1_BIDS')
-subjects_o1 = sorted([d for d in oasis1_bids.iterdir() if d.is_dir() and d.name.startswith('sub-')])
-
-for subject_dir in subjects_o1:
-    anat_dir = subject_dir / 'anat'
-    if not anat_dir.exists():
-        continue
-
-    # Trova tutti i T1w, prendi il primo run
-    t1w_files = sorted(anat_dir.glob('*_T1w.nii.gz'))
-    if t1w_files:
-        first_t1w = t1w_files[0]
-        processing_list.append({
-            'subject_id': subject_dir.name,
-            'input_image': str(first_t1w.absolute()),
-            'output_dir': str(oasis1_bids / 'derivatives' / 'synthseg'),
-            'num_threads': 4,
-            'dataset': 'OASIS1'
-        })
-
-print(f'Soggetti OASIS-1: {len([x for x in processing_list if x["dataset"]=="OASIS1"])}')
+# La radice è già assoluta: os.fspath evita il getcwd() di .absolute()
+# per ogni file, e la directory di output è costante per dataset
+oasis1_out = str(oasis1_bids / 'derivatives' / 'synthseg')
+
+# Trova tutti i T1w in una sola passata, prendi il primo run per soggetto
+for subject_id, first_t1w in baseline_t1w_scans(oasis1_bids, 'sub-*/anat/*_T1w.nii.gz', -3):
+    subject_ids.append(subject_id)
+    input_images.append(os.fspath(first_t1w))
+    output_dirs.append(oasis1_out)
+    dataset_labels.append('OASIS1')
+
+print(f'Soggetti OASIS-1: {dataset_labels.count("OASIS1")}')
 
 # ============================================================================
 # OASIS-2: Longitudinal (prendi baseline/ses-01, primo run)
 # ============================================================================
 print('\n### OASIS-2 ###')
 oasis2_bids = Path('/mnt/db_ext/RAW/oasis/OASIS2_BIDS')
-subjects_o2 = sorted([d for d in oasis2_bids.iterdir() if d.is_dir() and d.name.startswith('sub-')])
-
-for subject_dir in subjects_o2:
-    # Trova tutte le sessioni, ordina e prendi la prima (ses-01)
-    sessions = sorted([d for d in subject_dir.iterdir() if d.is_dir() and d.name.startswith('ses-')])
-    if not sessions:
-        continue
-
-    first_session = sessions[0]  # Prima sessione
-    anat_dir = first_session / 'anat'
-
-    if not anat_dir.exists():
-        continue
-
-    # Prendi il primo run
-    t1w_files = sorted(anat_dir.glob('*_T1w.nii.gz'))
-    if t1w_files:
-        first_t1w = t1w_files[0]
-        processing_list.append({
-            'subject_id': subject_dir.name,
-            'input_image': str(first_t1w.absolute()),
-            'output_dir': str(oasis2_bids / 'derivatives' / 'synthseg'),
-            'num_threads': 4,
-            'dataset': 'OASIS2'
-        })
-
-print(f'Soggetti OASIS-2 (baseline): {len([x for x in processing_list if x["dataset"]=="OASIS2"])}')
+oasis2_out = str(oasis2_bids / 'derivatives' / 'synthseg')
+
+# Prima sessione (ses-01), primo run: la prima hit per soggetto nel glob ordinato
+for subject_id, first_t1w in baseline_t1w_scans(oasis2_bids, 'sub-*/ses-*/anat/*_T1w.nii.gz', -4):
+    subject_ids.append(subject_id)
+    input_images.append(os.fspath(first_t1w))
+    output_dirs.append(oasis2_out)
+    dataset_labels.append('OASIS2')
+
+print(f'Soggetti OASIS-2 (baseline): {dataset_labels.count("OASIS2")}')
 
 # ============================================================================
 # OASIS-3: Longitudinal (prendi prima sessione, primo run)
 # ============================================================================
 print('\n### OASIS-3 ###')
 oasis3_bids = Path('/mnt/db_ext/RAW/oasis/OASIS3_BIDS')
-subjects_o3 = sorted([d for d in oasis3_bids.iterdir() if d.is_dir() and d.name.startswith('sub-')])
-
-for subject_dir in subjects_o3:
-    # Trova tutte le sessioni, ordina e prendi la prima
-    sessions = sorted([d for d in subject_dir.iterdir() if d.is_dir() and d.name.startswith('ses-')])
-    if not sessions:
-        continue
-
-    first_session = sessions[0]  # Prima sessione
-    anat_dir = first_session / 'anat'
-
-    if not anat_dir.exists():
-        continue
-
-    # Prendi il primo run
-    t1w_files = sorted(anat_dir.glob('*_T1w.nii.gz'))
-    if t1w_files:
-        first_t1w = t1w_files[0]
-        processing_list.append({
-            'subject_id': subject_dir.name,
-            'input_image': str(first_t1w.absolute()),
-            'output_dir': str(oasis3_bids / 'derivatives' / 'synthseg'),
-            'num_threads': 4,
-            'dataset': 'OASIS3'
-        })
-
-print(f'Soggetti OASIS-3 (baseline): {len([x for x in processing_list if x["dataset"]=="OASIS3"])}')
+oasis3_out = str(oasis3_bids / 'derivatives' / 'synthseg')
+
+for subject_id, first_t1w in baseline_t1w_scans(oasis3_bids, 'sub-*/ses-*/anat/*_T1w.nii.gz', -4):
+    subject_ids.append(subject_id)
+    input_images.append(os.fspath(first_t1w))
+    output_dirs.append(oasis3_out)
+    dataset_labels.append('OASIS3')
+
+print(f'Soggetti OASIS-3 (baseline): {dataset_labels.count("OASIS3")}')
 
 # ============================================================================
 # SRPBS: Cross-sectional (1 sessione per soggetto, no multiple run)
 # ============================================================================
 print('\n### SRPBS ###')
 srpbs_bids = Path('/mnt/db_ext/RAW/SRPBS_OPEN/SRPBS_BIDS')
-subjects_srpbs = sorted([d for d in srpbs_bids.iterdir() if d.is_dir() and d.name.startswith('sub-')])
-
-for subject_dir in subjects_srpbs:
-    anat_dir = subject_dir / 'anat'
-    if not anat_dir.exists():
-        continue
-
-    # SRPBS ha un solo T1w per soggetto
-    t1w_file = anat_dir / f"{subject_dir.name}_T1w.nii.gz"
+srpbs_out = str(srpbs_bids / 'derivatives' / 'synthseg')
 
-    if t1w_file.exists():
-        processing_list.append({
-            'subject_id': subject_dir.name,
-            'input_image': str(t1w_file.absolute()),
-            'output_dir': str(srpbs_bids / 'derivatives' / 'synthseg'),
-            'num_threads': 4,
-            'dataset': 'SRPBS'
-        })
+# SRPBS ha un solo T1w per soggetto
+for subject_id, t1w_file in baseline_t1w_scans(srpbs_bids, 'sub-*/anat/*_T1w.nii.gz', -3):
+    subject_ids.append(subject_id)
+    input_images.append(os.fspath(t1w_file))
+    output_dirs.append(srpbs_out)
+    dataset_labels.append('SRPBS')
 
-print(f'Soggetti SRPBS: {len([x for x in processing_list if x["dataset"]=="SRPBS"])}')
+print(f'Soggetti SRPBS: {dataset_labels.count("SRPBS")}')
 
 # ============================================================================
 # Create DataFrame and Save
 # ============================================================================
-df = pd.DataFrame(processing_list)
+df = pd.DataFrame({
+    'subject_id': subject_ids,
+    'input_image': input_images,
+    'output_dir': output_dirs,
+    'num_threads': 4,
+    'dataset': dataset_labels
+})
 
 # Rimuovi colonna dataset (era solo per debug)
 df_final = df[['subject_id', 'input_image', 'output_dir', 'num_threads']]
@@ -160,11 +139,12 @@ print(f'\nUltime 5 righe (SRPBS):')
 print(df_final.tail(5).to_string(index=False))
 
 # Verifica che tutte le immagini esistano
+# Thread pool: i controlli sono puri stat() e si sovrappongono bene
+# sulla latenza del filesystem, iterrows li farebbe uno alla volta
 print(f'\nVerifica esistenza file...')
-missing = 0
-for _, row in df_final.iterrows():
-    if not Path(row['input_image']).exists():
-        missing += 1
+with ThreadPoolExecutor(max_workers=32) as executor:
+    missing = sum(1 for ok in executor.map(os.path.exists, df_final['input_image'])
+                  if not ok)
 
 if missing == 0:
     print(f'✓ Tutti i {len(df_final)} file input esistono')
@@ -172,15 +152,26 @@ else:
     print(f'⚠ {missing} file input mancanti')
 
 # Create derivatives directories if they don't exist
-print(f'\nCreazione directory derivatives...')
-for output_dir in df['output_dir'].unique():
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-    print(f'  ✓ {output_path}')
+# String paths diretti a os.makedirs, senza allocare Path né stampare
+# una riga per directory
+unique_output_dirs = set(df['output_dir'])
+for output_dir in unique_output_dirs:
+    os.makedirs(output_dir, exist_ok=True)
+print(f'\n✓ Directory derivatives pronte ({len(unique_output_dirs)})')
 
 # Create dataset_description.json for SRPBS derivatives
 import json
 
+try:
+    import orjson
+
+    def write_json(path, obj):
+        path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+except ImportError:
+    def write_json(path, obj):
+        path.write_text(json.dumps(obj, indent=2))
+
+
 srpbs_derivatives = srpbs_bids / 'derivatives' / 'synthseg'
 desc_file = srpbs_derivatives / 'dataset_description.json'
 
@@ -205,8 +196,7 @@ if not desc_file.exists():
         ]
     }
 
-    with open(desc_file, 'w') as f:
-        json.dump(dataset_desc, f, indent=4)
+    write_json(desc_file, dataset_desc)
     print(f'\n✓ Created: {desc_file}')
 
 print('\n' + '='*80)
@@ -12,61 +12,78 @@ from pathlib import Path
 oasis3_data = "/mnt/db_ext/RAW/oasis/OASIS 3/OASIS3_data_files"
 oasis3_bids = "/mnt/db_ext/RAW/oasis/OASIS3_BIDS"
 
+
+def read_csv_fast(file_path):
+    """Read a CSV with the multi-threaded pyarrow engine when available."""
+    try:
+        return pd.read_csv(file_path, engine='pyarrow')
+    except (ImportError, ValueError):
+        return pd.read_csv(file_path)
+
+
 print("="*80)
 print("Creating OASIS-3 participants.tsv")
 print("="*80)
 
 # Load demographics
 demographics_file = f"{oasis3_data}/demo-demographics/resources/csv/files/OASIS3_demographics.csv"
-demographics = pd.read_csv(demographics_file)
+demographics = read_csv_fast(demographics_file)
 
 print(f"\nLoaded demographics: {len(demographics)} records")
 print(f"Columns: {list(demographics.columns)}")
 
 # Get list of subjects in BIDS dataset
-bids_subjects = sorted([d.name for d in Path(oasis3_bids).iterdir()
-                       if d.is_dir() and d.name.startswith('sub-')])
+# os.scandir: DirEntry.is_dir() reads the cached d_type, no per-entry stat
+bids_subjects = sorted(e.name for e in os.scandir(oasis3_bids)
+                       if e.name.startswith('sub-') and e.is_dir(follow_symlinks=False))
 
 print(f"\nBIDS subjects found: {len(bids_subjects)}")
 
 # Map subject IDs (sub-OAS3XXXX -> OAS3XXXX)
 bids_subject_ids = [s.replace('sub-', '') for s in bids_subjects]
 
-# Filter demographics for subjects in BIDS
-demo_filtered = demographics[demographics['OASISID'].isin(bids_subject_ids)]
+# One record per subject (first record), then a single indexed lookup of
+# the BIDS subjects: one hash build instead of a list-scan isin followed
+# by a groupby sort
+demo_unique = (demographics.drop_duplicates(subset='OASISID', keep='first')
+               .set_index('OASISID')
+               .reindex(bids_subject_ids)
+               .dropna(how='all')
+               .reset_index())
 
-print(f"Matched demographics: {len(demo_filtered)} subjects")
+print(f"Matched demographics: {len(demo_unique)} subjects")
 
-# Get one record per subject (use first record)
-demo_unique = demo_filtered.groupby('OASISID').first().reset_index()
-
-print(f"Unique subjects: {len(demo_unique)}")
-
-# Create participants dataframe
+# Create participants dataframe; missing values stay NaN so numeric
+# columns keep their dtype — to_csv writes them as 'n/a' via na_rep
 participants = pd.DataFrame({
     'participant_id': ['sub-' + s for s in demo_unique['OASISID']],
     'age_at_entry': demo_unique['AgeatEntry'],
-    'age_at_death': demo_unique['AgeatDeath'].fillna('n/a'),
+    'age_at_death': demo_unique['AgeatDeath'],
     'sex': demo_unique['GENDER'].map({1: 'M', 2: 'F'}),
-    'hand': demo_unique['HAND'].fillna('n/a'),
-    'race': demo_unique['race'].fillna('n/a'),
-    'ethnicity': demo_unique['ETHNIC'].fillna('n/a'),
-    'education_years': demo_unique['EDUC'].fillna('n/a'),
-    'apoe': demo_unique['APOE'].fillna('n/a')
+    'hand': demo_unique['HAND'],
+    'race': demo_unique['race'],
+    'ethnicity': demo_unique['ETHNIC'],
+    'education_years': demo_unique['EDUC'],
+    'apoe': demo_unique['APOE']
 })
 
 # Load CDR (Clinical Dementia Rating) data
 try:
     cdr_file = f"{oasis3_data}/UDSb4-Form_B4__Global_Staging__CDR__Standard_and_Supplemental/resources/csv/files/OASIS3_UDSb4_cdr.csv"
-    cdr = pd.read_csv(cdr_file)
+    cdr = read_csv_fast(cdr_file)
 
     # Get baseline CDR for each subject
     # CDR file uses 'Subject' column
-    cdr_baseline = cdr.groupby('Subject').first().reset_index()
-    cdr_dict = dict(zip(['sub-' + s for s in cdr_baseline['Subject']],
-                       cdr_baseline['cdr_global']))
-
-    participants['cdr'] = participants['participant_id'].map(cdr_dict).fillna('n/a')
+    # Stable sort + drop_duplicates keeps each subject's first record in
+    # file order, without building groupby's grouper indices
+    cdr_baseline = cdr.sort_values('Subject').drop_duplicates('Subject', keep='first')
+    # Series lookup keyed by the BIDS id: prefixing the ~1k index values
+    # once beats stripping the prefix from every participant_id, and map
+    # hashes the index without an intermediate dict
+    cdr_series = pd.Series(cdr_baseline['cdr_global'].values,
+                           index='sub-' + cdr_baseline['Subject'].astype(str))
+
+    participants['cdr'] = participants['participant_id'].map(cdr_series)
     print(f"\nAdded CDR data: {cdr['Subject'].nunique()} subjects")
 except Exception as e:
     print(f"\nWarning: Could not load CDR data: {e}")
@@ -77,7 +94,7 @@ participants = participants.sort_values('participant_id').reset_index(drop=True)
 
 # Save participants.tsv
 output_file = f"{oasis3_bids}/participants.tsv"
-participants.to_csv(output_file, sep='\t', index=False)
+participants.to_csv(output_file, sep='\t', index=False, na_rep='n/a')
 
 print(f"\n✓ Saved participants.tsv: {len(participants)} subjects")
 print(f"  File: {output_file}")
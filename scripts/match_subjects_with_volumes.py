@@ -11,13 +11,22 @@ from pathlib import Path
 data_dir = Path('/home/mario/Repository/Normal_Alzeihmer/data')
 volumes_dir = data_dir / 'volumes'
 
+
+def read_csv_fast(file_path):
+    """Read a CSV with the multi-threaded pyarrow engine when available."""
+    try:
+        return pd.read_csv(file_path, engine='pyarrow')
+    except (ImportError, ValueError):
+        return pd.read_csv(file_path)
+
+
 print('='*80)
 print('Matching Subjects with Volumes')
 print('='*80)
 
 # Load subjects
 subjects_file = data_dir / 'combined' / 'all_healthy_controls_age45plus.csv'
-subjects_df = pd.read_csv(subjects_file)
+subjects_df = read_csv_fast(subjects_file)
 print(f'\n✓ Loaded {len(subjects_df)} healthy control subjects')
 
 # Load volumes
@@ -33,24 +42,87 @@ volumes_files = {
 print('\nLoading volumes...')
 volumes_dfs = {}
 for dataset, file_path in volumes_files.items():
-    if file_path.exists():
-        df = pd.read_csv(file_path)
-        volumes_dfs[dataset] = df
-        print(f'  ✓ {dataset}: {len(df)} subjects with volumes')
+    # Prefer the Parquet companion written by the regeneration script:
+    # columnar load, no text parsing
+    parquet_file = file_path.with_suffix('.parquet')
+    if parquet_file.exists():
+        df = pd.read_parquet(parquet_file)
+        source = ' (parquet)'
+    elif file_path.exists():
+        df = read_csv_fast(file_path)
+        source = ''
     else:
         print(f'  ✗ {dataset}: File not found')
+        continue
+
+    # Project to the columns the merge and the output actually use; the
+    # merge copies every carried column, so dropping the rest up front
+    # shrinks its payload proportionally
+    keep_cols = ['subject_id'] + [c for c in df.columns
+                                  if c.startswith(('vol_', 'qc_'))]
+    volumes_dfs[dataset] = df[keep_cols]
+    print(f'  ✓ {dataset}: {len(df)} subjects with volumes{source}')
 
 # Match subjects with volumes
 print('\n' + '='*80)
 print('Matching by dataset...')
 print('='*80)
 
-matched_data = []
-missing_by_dataset = {}
+if not volumes_dfs:
+    print('\n✗ No volume files found!')
+    exit(1)
+
+# Pre-concatenate the volume tables with a dataset label and run one
+# hash-join on (dataset, subject_id_normalized): a single merge replaces
+# the per-dataset merge setup and the Python loop around it
+vol_all = pd.concat(
+    [df.assign(dataset=name) for name, df in volumes_dfs.items()],
+    ignore_index=True)
+
+# Normalize subject_id formats (remove BIDS "sub-" prefix if present)
+# str.removeprefix runs as one vectorized pass instead of a Python call
+# per row, and is skipped entirely when no id carries the prefix - the
+# common case for the regenerated volume tables
+for frame in (subjects_df, vol_all):
+    ids = frame['subject_id'].astype(str)
+    if ids.str.startswith('sub-').any():
+        frame['subject_id_normalized'] = ids.str.removeprefix('sub-')
+    else:
+        frame['subject_id_normalized'] = ids
+
+# Categorical merge keys: the hash-join then compares small integer
+# codes instead of Python strings; both sides must share one category
+# mapping for pandas to keep the dtype through the merge
+for col in ('dataset', 'subject_id_normalized'):
+    key_dtype = pd.CategoricalDtype(
+        pd.Index(subjects_df[col]).union(pd.Index(vol_all[col])))
+    subjects_df[col] = subjects_df[col].astype(key_dtype)
+    vol_all[col] = vol_all[col].astype(key_dtype)
+
+# validate='m:1' surfaces duplicate volume rows per subject immediately.
+# No indicator column: whether a row matched follows from the right-side
+# key being non-null, so there is no per-row Categorical to materialize
+merged = subjects_df.merge(
+    vol_all,
+    on=['dataset', 'subject_id_normalized'],
+    how='left',
+    suffixes=('', '_vol'),
+    validate='m:1'
+)
+
+matched_mask = merged['subject_id_vol'].notna()
+match_counts = merged.loc[matched_mask, 'dataset'].value_counts()
+
+# Per-dataset subject totals in one pass, instead of a boolean scan of
+# the dataset column per iteration
+subject_counts = subjects_df['dataset'].value_counts(sort=False)
 
-for dataset in subjects_df['dataset'].unique():
-    dataset_subjects = subjects_df[subjects_df['dataset'] == dataset].copy()
-    n_subjects = len(dataset_subjects)
+missing_by_dataset = {}
+for dataset, n_subjects in subject_counts.items():
+    # Categorical value_counts also lists datasets only seen on the
+    # volumes side; skip those
+    if n_subjects == 0:
+        continue
 
     print(f'\n{dataset}:')
     print(f'  Subjects: {n_subjects}')
@@ -60,44 +132,20 @@ for dataset in subjects_df['dataset'].unique():
         missing_by_dataset[dataset] = n_subjects
         continue
 
-    vol_df = volumes_dfs[dataset].copy()
-
-    # Normalize subject_id formats (remove BIDS "sub-" prefix if present)
-    def normalize_subject_id(sid):
-        sid = str(sid)
-        if sid.startswith('sub-'):
-            return sid[4:]  # Remove "sub-" prefix
-        return sid
-
-    dataset_subjects['subject_id_normalized'] = dataset_subjects['subject_id'].apply(normalize_subject_id)
-    vol_df['subject_id_normalized'] = vol_df['subject_id'].apply(normalize_subject_id)
-
-    # Merge on normalized IDs
-    merged = dataset_subjects.merge(
-        vol_df,
-        left_on='subject_id_normalized',
-        right_on='subject_id_normalized',
-        how='left',
-        suffixes=('', '_vol'),
-        indicator=True
-    )
-
-    n_matched = (merged['_merge'] == 'both').sum()
-    n_missing = (merged['_merge'] == 'left_only').sum()
+    n_matched = match_counts.get(dataset, 0)
+    n_missing = n_subjects - n_matched
 
     print(f'  ✓ Matched: {n_matched}/{n_subjects} ({n_matched/n_subjects*100:.1f}%)')
     if n_missing > 0:
         print(f'  ✗ Missing volumes: {n_missing}')
         missing_by_dataset[dataset] = n_missing
 
-    # Keep only matched subjects
-    matched = merged[merged['_merge'] == 'both'].copy()
-    matched = matched.drop(columns=['_merge'])
-    matched_data.append(matched)
+# Keep only matched subjects
+matched_data = merged[matched_mask]
 
 # Combine all matched data
 if len(matched_data) > 0:
-    combined_df = pd.concat(matched_data, ignore_index=True)
+    combined_df = matched_data.reset_index(drop=True)
 
     print('\n' + '='*80)
     print('COMBINED RESULTS')
@@ -133,6 +181,15 @@ if len(matched_data) > 0:
     print(f'\n✓ Saved matched data: {output_file}')
     print(f'✓ Shape: {combined_df.shape}')
 
+    # Parquet companion: typed and compressed, so the normative-model
+    # scripts reload the table without re-parsing the CSV
+    try:
+        parquet_file = output_file.with_suffix('.parquet')
+        combined_df.to_parquet(parquet_file, compression='zstd', index=False)
+        print(f'✓ Saved parquet: {parquet_file}')
+    except ImportError:
+        pass  # no pyarrow/fastparquet installed, CSV is enough
+
     # Summary of missing volumes
     if missing_by_dataset:
         print('\n' + '='*80)
@@ -8,6 +8,39 @@ import os
 import json
 from pathlib import Path
 import nibabel as nib
+import numpy as np
+
+def convert_one(hdr_file, output_nii):
+    """Convert one Analyze scan to compressed NIfTI and return the image.
+
+    Shared by the OASIS-1 and OASIS-2 test blocks; verification reuses
+    the returned in-memory image, so the freshly written .nii.gz is not
+    read back from disk.
+    """
+    print(f"   Loading: {hdr_file.name}")
+    img = nib.load(str(hdr_file))
+    print(f"   Original shape: {img.shape}")
+
+    # Squeeze if needed. Only materialize the data when a squeeze is
+    # required, and at the native dtype - get_fdata() would copy the
+    # whole volume to float64 just to re-wrap it
+    if img.ndim == 4 and img.shape[3] == 1:
+        data = np.asanyarray(img.dataobj)[:, :, :, 0]
+        print(f"   Squeezed to: {data.shape}")
+        nii_img = nib.Nifti1Image(data, img.affine, header=img.header)
+        nii_img.set_data_dtype(data.dtype)
+    else:
+        nii_img = img
+
+    # Save
+    nib.save(nii_img, str(output_nii))
+
+    # Check file size
+    file_size = output_nii.stat().st_size / (1024*1024)
+    print(f"   ✓ Saved: {output_nii.name} ({file_size:.1f} MB)")
+
+    return nii_img
+
 
 print("="*80)
 print("OASIS CONVERSION TEST")
@@ -53,31 +86,12 @@ output_base = f"{bids_subject_id}_run-01_T1w"
 output_nii = subject_dir / f"{output_base}.nii.gz"
 
 try:
-    # Load and convert
-    print(f"   Loading: {hdr_file.name}")
-    img = nib.load(str(hdr_file))
-    print(f"   Original shape: {img.shape}")
-
-    # Squeeze if needed
-    data = img.get_fdata()
-    if data.ndim == 4 and data.shape[3] == 1:
-        data = data[:, :, :, 0]
-        print(f"   Squeezed to: {data.shape}")
+    # Load, convert and verify against the in-memory image
+    nii_img = convert_one(hdr_file, output_nii)
+    print(f"   ✓ Verified: shape={nii_img.shape}")
 
-    # Save
-    nii_img = nib.Nifti1Image(data, img.affine)
-    nib.save(nii_img, str(output_nii))
-
-    # Check file size
-    file_size = output_nii.stat().st_size / (1024*1024)
-    print(f"   ✓ Saved: {output_nii.name} ({file_size:.1f} MB)")
-
-    # Verify it can be read back
-    test_img = nib.load(str(output_nii))
-    print(f"   ✓ Verified: shape={test_img.shape}")
-
-    if test_img.shape != (256, 256, 128):
-        print(f"   ⚠ Warning: unexpected shape {test_img.shape}")
+    if nii_img.shape != (256, 256, 128):
+        print(f"   ⚠ Warning: unexpected shape {nii_img.shape}")
 
 except Exception as e:
     print(f"   ✗ Error: {type(e).__name__}: {e}")
@@ -132,31 +146,12 @@ output_base = f"{bids_subject_id}_{bids_session_id}_run-01_T1w"
 output_nii = session_dir / f"{output_base}.nii.gz"
 
 try:
-    # Load and convert
-    print(f"   Loading: {hdr_file.name}")
-    img = nib.load(str(hdr_file))
-    print(f"   Original shape: {img.shape}")
-
-    # Squeeze if needed
-    data = img.get_fdata()
-    if data.ndim == 4 and data.shape[3] == 1:
-        data = data[:, :, :, 0]
-        print(f"   Squeezed to: {data.shape}")
-
-    # Save
-    nii_img = nib.Nifti1Image(data, img.affine)
-    nib.save(nii_img, str(output_nii))
-
-    # Check file size
-    file_size = output_nii.stat().st_size / (1024*1024)
-    print(f"   ✓ Saved: {output_nii.name} ({file_size:.1f} MB)")
-
-    # Verify it can be read back
-    test_img = nib.load(str(output_nii))
-    print(f"   ✓ Verified: shape={test_img.shape}")
+    # Load, convert and verify against the in-memory image
+    nii_img = convert_one(hdr_file, output_nii)
+    print(f"   ✓ Verified: shape={nii_img.shape}")
 
-    if test_img.shape != (256, 256, 128):
-        print(f"   ⚠ Warning: unexpected shape {test_img.shape}")
+    if nii_img.shape != (256, 256, 128):
+        print(f"   ⚠ Warning: unexpected shape {nii_img.shape}")
 
 except Exception as e:
     print(f"   ✗ Error: {type(e).__name__}: {e}")